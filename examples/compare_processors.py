@@ -35,10 +35,10 @@ def test_llama_processor():
     print("\nAnswer:", result["answer"])
     print("\nSources:")
     for source in result["sources"]:
-        metadata = source.get('metadata', {})
-        score = source.get('score', 0)
+        metadata = source.metadata
+        score = source.score
         print(f"\n- Score: {score:.2f if score else 'N/A'}")
-        print(f"  {source['text'][:200]}...")
+        print(f"  {source.text[:200]}...")
 
 def test_rag_processor():
     """Test the original RAG processor."""
@@ -74,8 +74,8 @@ def test_rag_processor():
     print("\nAnswer:", result["answer"])
     print("\nSources:")
     for source in result["sources"]:
-        print(f"\n- From {source['metadata']['header']} (score: {source['score']:.2f}):")
-        print(f"  {source['text'][:200]}...")
+        print(f"\n- From {source.metadata['header']} (score: {source.score:.2f}):")
+        print(f"  {source.text[:200]}...")
 
 def main():
     # Load environment variables
@@ -1,16 +1,19 @@
 """Core RAG processor implementation."""
-from typing import List, Dict, Any, Optional, Type
+from typing import List, Dict, Any, Optional, Type, BinaryIO
 from langchain_anthropic import ChatAnthropic
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
 from langchain.callbacks import get_openai_callback
-import json
+import asyncio
+import atexit
 from datetime import datetime
 from datetime import timezone
 import os
+import orjson
 
 from vectorstores.base import VectorStore
-from processors.text_processor import TextProcessor
+from processors.text_processor import TextProcessor, DEFAULT_HEADER_CACHE_PATH
+from core.types import Source
+
+NO_RESULTS_ANSWER = "I couldn't find any relevant information to answer your question."
 
 class RAGProcessor:
     """Main RAG processor that combines vector store and LLM."""
@@ -19,16 +22,18 @@ class RAGProcessor:
         self,
         vector_store: VectorStore,
         anthropic_api_key: str,
-        model_name: str = "claude-2"
+        model_name: str = "claude-2",
+        embed_batch_size: int = 64,
+        header_cache_path: Optional[str] = DEFAULT_HEADER_CACHE_PATH
     ):
+        """header_cache_path is passed to TextProcessor; None disables the header cache."""
         self.vector_store = vector_store
+        self.embed_batch_size = embed_batch_size
         self.llm = ChatAnthropic(api_key=anthropic_api_key, model_name=model_name)
-        self.text_processor = TextProcessor()
+        self.text_processor = TextProcessor(cache_path=header_cache_path)
         
-        # Set up the QA chain
-        self.qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""You are an expert in reinforcement learning. Based on the following excerpts from a textbook, please answer the question accurately and concisely. If you cannot answer the question based on the excerpts, say so.
+        # Set up the QA prompt as a plain format string
+        self._prompt_template_str = """You are an expert in reinforcement learning. Based on the following excerpts from a textbook, please answer the question accurately and concisely. If you cannot answer the question based on the excerpts, say so.
 
 Excerpts from textbook:
 {context}
@@ -36,8 +41,10 @@ Excerpts from textbook:
 Question: {question}
 
 Answer: Let me analyze the excerpts and provide a clear answer."""
-        )
-        self.qa_chain = LLMChain(llm=self.llm, prompt=self.qa_prompt)
+        
+        # One API-call log per processor, opened on the first call so
+        # ingest-only runs don't leave empty files behind
+        self._log_fh = None
     
     def add_document(self, file_path: str, metadata: Optional[Dict[str, Any]] = None) -> List[str]:
         """Process and add a document to the vector store."""
@@ -48,17 +55,64 @@ Answer: Let me analyze the excerpts and provide a clear answer."""
             metadata = {}
         
         # Add file metadata to each section
-        metadatas = []
-        for section in sections:
-            section_metadata = metadata.copy()
-            section_metadata.update({
+        metadatas = [
+            {
+                **metadata,
                 "file_path": file_path,
                 "header": section["header"],
                 "start_page": section["start_page"]
-            })
-            metadatas.append(section_metadata)
+            }
+            for section in sections
+        ]
+        
+        return self.vector_store.add_texts(texts, metadatas, batch_size=self.embed_batch_size)
+    
+    def _build_prompt(self, question: str, results: List[Dict[str, Any]]) -> str:
+        """Render the QA prompt for a question and its retrieved documents."""
+        # Format context from retrieved documents
+        context = "\n\n".join(f"[{r['metadata'].get('header', 'Section')}]\n{r['text']}" 
+                            for r in results)
+        return self._prompt_template_str.format(context=context, question=question)
+    
+    def _open_log(self) -> BinaryIO:
+        """Open this processor's API-call log for appending."""
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        log_dir = os.path.join(script_dir, '..', '..', '..', 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        # Get store type and timestamp for unique filename
+        store_type = self.vector_store.__class__.__name__.lower().replace('vectorstore', '')
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+        log_path = os.path.join(log_dir, f"api_call_{store_type}_{timestamp}.jsonl")
+        log_fh = open(log_path, 'ab', buffering=0)
+        atexit.register(log_fh.close)
+        print(f"\nLogging API calls to: {log_path}")
+        return log_fh
+    
+    def _log_api_call(self, question: str, prompt_str: str, answer: str, cb: Any, batch_size: int = 1) -> None:
+        """Append one API call record to the JSONL log."""
+        api_call = {
+            'timestamp': datetime.now(timezone.utc),
+            'question': question,
+            'prompt': prompt_str,
+            'answer': answer,
+            'prompt_tokens': cb.prompt_tokens,
+            'completion_tokens': cb.completion_tokens,
+            'total_tokens': cb.total_tokens,
+            'total_cost': cb.total_cost,
+            'batch_size': batch_size
+        }
         
-        return self.vector_store.add_texts(texts, metadatas)
+        if self._log_fh is None:
+            self._log_fh = self._open_log()
+        self._log_fh.write(orjson.dumps(api_call, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NAIVE_UTC))
+    
+    @staticmethod
+    def _format_result(answer: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the query response from an answer and its sources."""
+        return {
+            "answer": answer,
+            "sources": [Source(r["text"], r["metadata"], r["score"]) for r in results]
+        }
     
     def query(self, question: str, k: int = 4) -> Dict[str, Any]:
         """Query the RAG system."""
@@ -66,51 +120,48 @@ Answer: Let me analyze the excerpts and provide a clear answer."""
         results = self.vector_store.similarity_search(question, k=k)
         
         if not results:
-            return {
-                "answer": "I couldn't find any relevant information to answer your question.",
-                "sources": []
-            }
+            return self._format_result(NO_RESULTS_ANSWER, [])
         
-        # Format context from retrieved documents
-        context = "\n\n".join(f"[{r['metadata'].get('header', 'Section')}]\n{r['text']}" 
-                            for r in results)
+        # Render the prompt once; it is sent to the LLM and logged as-is
+        prompt_str = self._build_prompt(question, results)
         
         # Get answer from LLM with callback to log API calls
         with get_openai_callback() as cb:
-            answer = self.qa_chain.run(context=context, question=question)
+            answer = self.llm.invoke(prompt_str).content
             
             # Log to file
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            log_dir = os.path.join(script_dir, '..', '..', '..', 'logs')
-            os.makedirs(log_dir, exist_ok=True)
-            # Get store type and timestamp for unique filename
-            store_type = self.vector_store.__class__.__name__.lower().replace('vectorstore', '')
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            log_file = os.path.join(log_dir, f"api_call_{store_type}_{timestamp}.jsonl")
-            print(f"\nLogging API call to: {log_file}")
-            
-            api_call = {
-                'timestamp': datetime.now(timezone.utc).isoformat(timespec='microseconds'),
-                'question': question,
-                'prompt': self.qa_prompt.format(context=context, question=question),
-                'answer': answer,
-                'prompt_tokens': cb.prompt_tokens,
-                'completion_tokens': cb.completion_tokens,
-                'total_tokens': cb.total_tokens,
-                'total_cost': cb.total_cost
-            }
-            
-            with open(log_file, 'a') as f:
-                f.write(json.dumps(api_call) + '\n')
+            self._log_api_call(question, prompt_str, answer, cb)
         
-        return {
-            "answer": answer,
-            "sources": [
-                {
-                    "text": r["text"],
-                    "metadata": r["metadata"],
-                    "score": r["score"]
-                }
-                for r in results
-            ]
-        }
+        return self._format_result(answer, results)
+    
+    async def aquery(self, questions: List[str], k: int = 4) -> List[Dict[str, Any]]:
+        """
+        Query the RAG system for several questions at once.
+        Retrieval runs concurrently and all prompts go to the LLM in one batch.
+        Returns one response per question, in order.
+        """
+        all_results = await asyncio.gather(
+            *[self.vector_store.asimilarity_search(question, k=k) for question in questions]
+        )
+        
+        # Only questions with retrieved context are sent to the LLM
+        pending = [
+            (i, self._build_prompt(question, results))
+            for i, (question, results) in enumerate(zip(questions, all_results))
+            if results
+        ]
+        
+        answers = {}
+        if pending:
+            with get_openai_callback() as cb:
+                messages = await self.llm.abatch([prompt_str for _, prompt_str in pending])
+                
+                # Token counts in the log are totals for the whole batch
+                for (i, prompt_str), message in zip(pending, messages):
+                    answers[i] = message.content
+                    self._log_api_call(questions[i], prompt_str, message.content, cb, batch_size=len(pending))
+        
+        return [
+            self._format_result(answers[i], results) if i in answers else self._format_result(NO_RESULTS_ANSWER, [])
+            for i, results in enumerate(all_results)
+        ]
@@ -0,0 +1,5 @@
+"""Result types shared by the RAG processors."""
+import collections
+
+# A retrieved source document; a compact tuple rather than a per-result dict
+Source = collections.namedtuple("Source", "text metadata score")
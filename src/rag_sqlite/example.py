@@ -42,8 +42,8 @@ def main():
     print("\nAnswer:", result["answer"])
     print("\nSources:")
     for source in result["sources"]:
-        print(f"\n- From {source['metadata']['header']} (score: {source['score']:.2f}):")
-        print(f"  {source['text'][:200]}...")
+        print(f"\n- From {source.metadata['header']} (score: {source.score:.2f}):")
+        print(f"  {source.text[:200]}...")
 
 if __name__ == "__main__":
     main()
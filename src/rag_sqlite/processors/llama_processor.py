@@ -1,7 +1,9 @@
 """LlamaIndex-based document processor."""
+import functools
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 import json
+import orjson
 
 from llama_index.core import (
     VectorStoreIndex,
@@ -14,6 +16,21 @@ from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.anthropic import Anthropic
 from llama_index.core.node_parser import SentenceSplitter
 
+from core.types import Source
+
+@functools.lru_cache(maxsize=4)
+def _get_embed_model(model_name: str) -> HuggingFaceEmbedding:
+    """Load an embedding model once per process and share it across processors."""
+    import torch
+    
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return HuggingFaceEmbedding(model_name=model_name, device=device)
+
+@functools.lru_cache(maxsize=4)
+def _get_llm(api_key: Optional[str], model: str) -> Anthropic:
+    """Create an Anthropic client once per key/model and share it across processors."""
+    return Anthropic(api_key=api_key, model=model)
+
 class LlamaProcessor:
     """Process documents using LlamaIndex."""
     
@@ -29,8 +46,9 @@ class LlamaProcessor:
         # Initialize Milvus connection
         from pymilvus import connections, Collection, utility
         
-        # Connect to Milvus
-        connections.connect(uri=milvus_uri)
+        # Connect to Milvus, reusing an existing connection
+        if not connections.has_connection("default"):
+            connections.connect(uri=milvus_uri)
         
         # Handle collection
         if reset_collection and utility.has_collection(collection_name):
@@ -50,15 +68,10 @@ class LlamaProcessor:
         )
         
         # Set up embedding model
-        embed_model = HuggingFaceEmbedding(
-            model_name=embedding_model
-        )
+        embed_model = _get_embed_model(embedding_model)
         
         # Set up LLM
-        llm = Anthropic(
-            api_key=anthropic_api_key,
-            model="claude-3-opus-20240229"
-        )
+        llm = _get_llm(anthropic_api_key, "claude-3-opus-20240229")
         
         # Configure global settings
         Settings.llm = llm
@@ -136,19 +149,14 @@ class LlamaProcessor:
             # Process source nodes
             if hasattr(response, 'source_nodes'):
                 for node in response.source_nodes:
-                    source = {
-                        "text": node.text,
-                        "score": float(node.score) if hasattr(node, 'score') else None,
-                        "metadata": {}
-                    }
+                    score = float(node.score) if hasattr(node, 'score') else None
                     
-                    # Clean and format metadata
+                    # Round-trip metadata through JSON so it is plain, serializable data
+                    metadata = {}
                     if hasattr(node, 'metadata'):
-                        for k, v in node.metadata.items():
-                            if v is not None:
-                                source["metadata"][k] = str(v)
+                        metadata = orjson.loads(orjson.dumps(node.metadata, default=str))
                     
-                    result["sources"].append(source)
+                    result["sources"].append(Source(node.text, metadata, score))
             
             return result
             
@@ -1,98 +1,246 @@
 """Text processing utilities."""
+import hashlib
+import json
+import math
+import multiprocessing
+import os
 import re
-from typing import List, Dict, Any
-from PyPDF2 import PdfReader
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+# Chapter headers, section headers like 1.2 Topic, "Section N" headers
+# and ALL CAPS headers, matched in a single pass over the page. Kept at
+# module level so worker processes compile it once at import.
+_HEADER_RE = re.compile(
+    r'(?P<chap>^Chapter\s+\d+[.:]\s+.+$)'
+    r'|(?P<num>^\d+\.\d+\s+.+$)'
+    r'|(?P<sec>^Section\s+\d+[.:]\s+.+$)'
+    r'|(?P<caps>^[A-Z][A-Z\s]+$)',
+    re.MULTILINE
+)
+
+# Bump when the shape of cached header tuples changes
+_HEADER_CACHE_VERSION = b"2"
+
+# Pages sent to each pool worker per task, to amortize IPC overhead
+_DETECT_CHUNKSIZE = 8
+
+# The header scan runs at roughly 10M chars/s, while each forkserver/spawn
+# worker costs ~0.2s to start (it re-imports the entry script). Below this
+# much uncached text, an ordinary book, the serial scan is faster
+_POOL_MIN_CHARS = 8_000_000
+
+# Header cache lives in cache/ at the repository root, alongside logs/
+DEFAULT_HEADER_CACHE_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'cache', 'header_cache.db'
+))
+
+# Never fork pool workers: by the time pages are scanned the caller may hold
+# live gRPC or torch threads, and forking a process that has them can deadlock
+_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def _detect_headers(text: str) -> List[tuple]:
+    """Module-level header scan, picklable by reference for pool workers."""
+    return [(match.start(), match.end(), match.group()) for match in _HEADER_RE.finditer(text)]
 
 class TextProcessor:
     """Process and split text documents."""
     
+    def __init__(self, cache_path: Optional[str] = DEFAULT_HEADER_CACHE_PATH):
+        """
+        cache_path is a SQLite file that remembers detected headers per page
+        text, so re-ingesting the same PDF skips the regex scan. Pass None to
+        disable the cache.
+        """
+        self.cache_path = cache_path
+    
     def detect_section_headers(self, text: str) -> List[tuple]:
         """
         Detect potential section headers in text.
-        Returns a list of (start_pos, header_text) tuples.
+        Returns a list of (start_pos, end_pos, header_text) tuples in document order.
         """
-        patterns = [
-            r'^Chapter\s+\d+[\.\:]\s+.+$',  # Chapter headers
-            r'^\d+\.\d+\s+.+$',             # Section headers like 1.2 Topic
-            r'^Section\s+\d+[\.\:]\s+.+$',  # Section headers
-            r'^[A-Z][A-Z\s]+$',             # ALL CAPS headers
-        ]
-        
-        headers = []
-        for pattern in patterns:
-            for match in re.finditer(pattern, text, re.MULTILINE):
-                headers.append((match.start(), match.group()))
-        
-        return sorted(headers)
+        return _detect_headers(text)
     
-    def extract_text_from_pdf(self, pdf_path: str) -> Dict[int, str]:
-        """Extract text content from a PDF file, page by page."""
+    def iter_pdf_pages(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield (page_num, text) for each non-empty page of a PDF file, in order."""
         try:
-            reader = PdfReader(pdf_path)
-            pages = {}
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    pages[i] = page_text
-            return pages
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                for i, page in enumerate(pdf):
+                    # Close each page as we go so PDFium doesn't hold the whole book
+                    try:
+                        # Image-only (e.g. scanned) pages have no text objects; skip
+                        # building a text page for them. Text can also sit inside
+                        # (arbitrarily nested) form XObjects, so any top-level form
+                        # counts as possible text rather than descending into it
+                        text_objects = page.get_objects(
+                            filter=[pdfium_c.FPDF_PAGEOBJ_TEXT, pdfium_c.FPDF_PAGEOBJ_FORM],
+                            max_depth=1
+                        )
+                        if next(text_objects, None) is None:
+                            continue
+                        textpage = page.get_textpage()
+                        page_text = textpage.get_text_bounded()
+                        textpage.close()
+                    finally:
+                        page.close()
+                    if page_text:
+                        # PDFium separates lines with CRLF; header patterns expect LF
+                        yield i, page_text.replace("\r\n", "\n")
+            finally:
+                pdf.close()
         except Exception as e:
             print(f"Error extracting text from {pdf_path}: {e}")
-            return {}
     
-    def split_by_sections(self, pages: Dict[int, str]) -> List[Dict[str, Any]]:
+    def _page_key(self, page_text: str) -> str:
+        """Cache key for a page: hash of the cache format, header pattern and page text."""
+        digest = hashlib.blake2b(_HEADER_CACHE_VERSION + _HEADER_RE.pattern.encode(), digest_size=16)
+        digest.update(page_text.encode())
+        return digest.hexdigest()
+    
+    def _load_cached_headers(self, keys: List[str]) -> Dict[str, List[tuple]]:
+        """Fetch cached header lists for the given page keys."""
+        cached = {}
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        with sqlite3.connect(self.cache_path) as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS page_headers (key TEXT PRIMARY KEY, headers TEXT)'
+            )
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ','.join('?' for _ in batch)
+                rows = conn.execute(
+                    f'SELECT key, headers FROM page_headers WHERE key IN ({placeholders})', batch
+                )
+                for key, headers in rows:
+                    cached[key] = [tuple(h) for h in json.loads(headers)]
+        return cached
+    
+    def _store_cached_headers(self, entries: List[Tuple[str, List[tuple]]]) -> None:
+        """Persist header lists keyed by page key."""
+        with sqlite3.connect(self.cache_path) as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO page_headers (key, headers) VALUES (?, ?)',
+                [(key, json.dumps(headers)) for key, headers in entries]
+            )
+    
+    def _detect_all(self, pages: List[Tuple[int, str]]) -> Dict[int, List[tuple]]:
+        """
+        Detect headers on every page, keyed by page number.
+        Pages seen before are served from the header cache; the rest are
+        scanned serially, or across a process pool when there is enough
+        uncached text to pay for starting one.
+        """
+        if self.cache_path:
+            keys = [self._page_key(page_text) for _, page_text in pages]
+            cached = self._load_cached_headers(keys)
+        else:
+            keys = [None] * len(pages)
+            cached = {}
+        
+        misses = [i for i, key in enumerate(keys) if key not in cached]
+        page_texts = [pages[i][1] for i in misses]
+        
+        cpu_count = os.cpu_count() or 1
+        if (
+            cpu_count < 2
+            or len(page_texts) <= _DETECT_CHUNKSIZE
+            or sum(map(len, page_texts)) < _POOL_MIN_CHARS
+        ):
+            headers = [_detect_headers(page_text) for page_text in page_texts]
+        else:
+            # Don't start workers that would never receive a chunk of pages
+            max_workers = min(cpu_count, math.ceil(len(page_texts) / _DETECT_CHUNKSIZE))
+            # Map the module-level function so workers never receive a pickled TextProcessor
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(_POOL_START_METHOD)
+            ) as executor:
+                headers = list(executor.map(_detect_headers, page_texts, chunksize=_DETECT_CHUNKSIZE))
+        
+        if self.cache_path and misses:
+            self._store_cached_headers([(keys[i], page_headers) for i, page_headers in zip(misses, headers)])
+        
+        headers_by_page = {pages[i][0]: page_headers for i, page_headers in zip(misses, headers)}
+        for (page_num, _), key in zip(pages, keys):
+            if key in cached:
+                headers_by_page[page_num] = cached[key]
+        
+        return headers_by_page
+    
+    def split_by_sections(self, pages: Iterable[Tuple[int, str]]) -> List[Dict[str, Any]]:
         """
         Split text into sections based on detected headers.
+        Pages are consumed as (page_num, text) pairs in page order. They are
+        read into memory up front, since headers for all pages are detected
+        (and cached) in one batch before sections are assembled.
         Returns a list of section dictionaries with header, content, and page info.
         """
+        pages = list(pages)
+        headers_by_page = self._detect_all(pages)
+        
         sections = []
-        current_section = {"header": "Introduction", "content": "", "start_page": 0}
+        # Content is buffered as a list of chunks and joined once per section
+        current_section = {"header": "Introduction", "chunks": [], "start_page": 0}
         
-        for page_num, page_text in sorted(pages.items()):
+        for page_num, page_text in pages:
             # If this is the first page, set it as the start page
-            if not sections and not current_section["content"]:
+            if not sections and not current_section["chunks"]:
                 current_section["start_page"] = page_num
             
-            headers = self.detect_section_headers(page_text)
+            headers = headers_by_page[page_num]
             
             if not headers:
                 # No headers on this page, add to current section
-                current_section["content"] += f"\n\n{page_text}"
+                current_section["chunks"].append(page_text)
             else:
                 # For each header on the page
-                last_pos = 0
-                for pos, header_text in headers:
+                last_end = 0
+                for start, end, header_text in headers:
                     # Add content before this header to current section
-                    if pos > 0:
-                        current_section["content"] += f"\n\n{page_text[last_pos:pos]}"
+                    if start > 0:
+                        current_section["chunks"].append(page_text[last_end:start])
                     
                     # Save current section if it has content
-                    if current_section["content"].strip():
-                        sections.append(current_section)
+                    if any(c.strip() for c in current_section["chunks"]):
+                        sections.append(self._finalize_section(current_section))
                     
                     # Start a new section
                     current_section = {
                         "header": header_text,
-                        "content": "",
+                        "chunks": [],
                         "start_page": page_num
                     }
                     
-                    last_pos = pos + len(header_text)
+                    last_end = end
                 
                 # Add remaining content after the last header
-                if last_pos < len(page_text):
-                    current_section["content"] += page_text[last_pos:]
+                if last_end < len(page_text):
+                    current_section["chunks"].append(page_text[last_end:])
         
         # Add the final section if it has content
-        if current_section["content"].strip():
-            sections.append(current_section)
+        if any(c.strip() for c in current_section["chunks"]):
+            sections.append(self._finalize_section(current_section))
         
         return sections
     
+    @staticmethod
+    def _finalize_section(section: Dict[str, Any]) -> Dict[str, Any]:
+        """Join a section's buffered chunks into its final content."""
+        return {
+            "header": section["header"],
+            "content": "\n\n".join(section["chunks"]),
+            "start_page": section["start_page"]
+        }
+    
     def process_document(self, file_path: str) -> List[Dict[str, Any]]:
         """Process a document and split it into sections."""
         if file_path.lower().endswith('.pdf'):
-            pages = self.extract_text_from_pdf(file_path)
-            return self.split_by_sections(pages)
+            return self.split_by_sections(self.iter_pdf_pages(file_path))
         else:
             # For now, just handle PDFs
             raise ValueError("Only PDF files are supported at the moment")
@@ -1,6 +1,10 @@
 """Script to query the RAG system."""
 import os
+import sys
 import argparse
+import asyncio
+import threading
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 from vectorstores.factory import create_vector_store
 from core.rag_processor import RAGProcessor
@@ -9,9 +13,7 @@ from processors.llama_processor import LlamaProcessor
 def format_sources(sources):
     """Format source documents for display."""
     for source in sources:
-        text = source["text"]
-        metadata = source["metadata"]
-        score = source["score"]
+        text, metadata, score = source
         
         # Get title from metadata or use filename
         title = metadata.get("title", metadata.get("file_name", "Unknown Source"))
@@ -22,6 +24,91 @@ def format_sources(sources):
         print(f"\n- From {title} (score: {score_str}):")  
         print(f"  {text}\n")
 
+def read_questions(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, ready: Optional[threading.Event]):
+    """
+    Read questions from stdin and hand them to the event loop; None marks EOF.
+    With ready (interactive stdin), each prompt waits until the previous
+    answer has been printed; otherwise lines are read as fast as they arrive.
+    """
+    while True:
+        if ready is not None:
+            ready.wait()
+            ready.clear()
+        try:
+            question = input("\nEnter your question: ")
+        except EOFError:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+            return
+        if question.strip():
+            loop.call_soon_threadsafe(queue.put_nowait, question)
+        elif ready is not None:
+            ready.set()
+
+async def drain_questions(queue: asyncio.Queue, max_batch: int, window: float) -> Tuple[List[str], bool]:
+    """
+    Wait for a question, then collect any others arriving within the window.
+    Returns the batch and whether input has ended.
+    """
+    question = await queue.get()
+    if question is None:
+        return [], True
+    
+    batch = [question]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + window
+    while len(batch) < max_batch:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            question = await asyncio.wait_for(queue.get(), remaining)
+        except asyncio.TimeoutError:
+            break
+        if question is None:
+            return batch, True
+        batch.append(question)
+    
+    return batch, False
+
+async def answer_questions(processor, questions: List[str]) -> List[dict]:
+    """Answer a batch of questions, with a single LLM batch call when supported."""
+    if isinstance(processor, RAGProcessor):
+        return await processor.aquery(questions)
+    return await asyncio.gather(*[asyncio.to_thread(processor.query, q) for q in questions])
+
+async def query_loop(processor, max_batch: int, window: float):
+    """Interactive loop that coalesces pending questions into batches."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    
+    # A terminal user asks one question at a time, so there is nothing to
+    # coalesce; piped input is read ahead and batched
+    ready = None
+    if sys.stdin.isatty():
+        ready = threading.Event()
+        ready.set()
+        window = 0
+    threading.Thread(target=read_questions, args=(loop, queue, ready), daemon=True).start()
+    
+    done = False
+    while not done:
+        questions, done = await drain_questions(queue, max_batch, window)
+        if not questions:
+            continue
+        
+        # Query the system
+        results = await answer_questions(processor, questions)
+        
+        # Display results
+        for question, result in zip(questions, results):
+            if len(questions) > 1:
+                print("\nQuestion:", question)
+            print("\nAnswer:", result["answer"])
+            format_sources(result["sources"])
+        
+        if ready is not None:
+            ready.set()
+
 def main():
     # Parse arguments
     parser = argparse.ArgumentParser(description="Query the RAG system")
@@ -31,6 +118,18 @@ def main():
         default="llama",
         help="Which processor to use (default: llama)"
     )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=8,
+        help="Maximum number of pending questions answered together (default: 8)"
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=50,
+        help="Milliseconds to wait for more questions before answering (default: 50)"
+    )
     args = parser.parse_args()
     
     # Load environment variables
@@ -61,21 +160,10 @@ def main():
     print("=" * 50)
     
     try:
-        while True:
-            # Get question from user
-            question = input("\nEnter your question: ")
-            if not question.strip():
-                continue
-                
-            # Query the system
-            result = processor.query(question)
-            
-            # Display results
-            print("\nAnswer:", result["answer"])
-            format_sources(result["sources"])
-            
+        asyncio.run(query_loop(processor, args.max_batch, args.batch_window / 1000))
     except KeyboardInterrupt:
-        print("\nGoodbye!")
+        pass
+    print("\nGoodbye!")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,111 @@
+/*
+ * BM25 scoring kernel for one posting list.
+ *
+ * Build next to bm25.py, e.g.:
+ *   cc -O3 -march=native -shared -fPIC -o _bm25_kernel.so _bm25_kernel.c
+ *
+ * Uses AVX2+FMA on x86 and NEON on AArch64 when the compiler targets them,
+ * otherwise plain scalar code. Scores are scattered one lane at a time since
+ * neither ISA has a float scatter (doc ids within a posting list are unique).
+ *
+ * The doc_len gathers and scores scatters are random accesses on long posting
+ * lists, so the lines they touch are prefetched pf_dist postings ahead
+ * (0 disables prefetching).
+ */
+#include <stdint.h>
+
+#if defined(__AVX2__) && defined(__FMA__)
+#include <immintrin.h>
+#elif defined(__ARM_NEON) && defined(__aarch64__)
+#include <arm_neon.h>
+#endif
+
+void bm25_score_term(
+    float *scores_out,
+    const int32_t *col_idx,
+    const float *tf,
+    const float *doc_len,
+    float idf_t,
+    float k1,
+    float b,
+    float avgdl,
+    int64_t n,
+    int64_t pf_dist)
+{
+    const float inv_avgdl = 1.0f / avgdl;
+    const float one_minus_b = 1.0f - b;
+    const float idf_k1p1 = idf_t * (k1 + 1.0f);
+    int64_t i = 0;
+    /* Postings whose prefetch target is still inside the list */
+    const int64_t n_pf = pf_dist > 0 ? n - pf_dist : 0;
+
+#if defined(__AVX2__) && defined(__FMA__)
+    const __m256 b_vec = _mm256_set1_ps(b * inv_avgdl);
+    const __m256 one_minus_b_vec = _mm256_set1_ps(one_minus_b);
+    const __m256 k1_vec = _mm256_set1_ps(k1);
+    const __m256 idf_k1p1_vec = _mm256_set1_ps(idf_k1p1);
+    float out[8];
+
+    for (; i + 8 <= n; i += 8) {
+        for (int64_t j = i; j < i + 8 && j < n_pf; j++) {
+            __builtin_prefetch(&scores_out[col_idx[j + pf_dist]], 1, 0);
+            __builtin_prefetch(&doc_len[col_idx[j + pf_dist]], 0, 0);
+        }
+        if (i < n_pf) {
+            __builtin_prefetch(&tf[i + pf_dist], 0, 0);
+        }
+        __m256i idx = _mm256_loadu_si256((const __m256i *)(col_idx + i));
+        __m256 dl = _mm256_i32gather_ps(doc_len, idx, 4);
+        __m256 tf_vec = _mm256_loadu_ps(tf + i);
+        /* tf + k1 * (1 - b + b * dl / avgdl) */
+        __m256 norm = _mm256_fmadd_ps(b_vec, dl, one_minus_b_vec);
+        __m256 denom = _mm256_fmadd_ps(k1_vec, norm, tf_vec);
+        __m256 num = _mm256_mul_ps(tf_vec, idf_k1p1_vec);
+        _mm256_storeu_ps(out, _mm256_div_ps(num, denom));
+        for (int j = 0; j < 8; j++) {
+            scores_out[col_idx[i + j]] += out[j];
+        }
+    }
+#elif defined(__ARM_NEON) && defined(__aarch64__)
+    const float32x4_t b_vec = vdupq_n_f32(b * inv_avgdl);
+    const float32x4_t one_minus_b_vec = vdupq_n_f32(one_minus_b);
+    const float32x4_t k1_vec = vdupq_n_f32(k1);
+    const float32x4_t idf_k1p1_vec = vdupq_n_f32(idf_k1p1);
+    float dl_lanes[4];
+    float out[4];
+
+    for (; i + 4 <= n; i += 4) {
+        for (int64_t j = i; j < i + 4 && j < n_pf; j++) {
+            __builtin_prefetch(&scores_out[col_idx[j + pf_dist]], 1, 0);
+            __builtin_prefetch(&doc_len[col_idx[j + pf_dist]], 0, 0);
+        }
+        if (i < n_pf) {
+            __builtin_prefetch(&tf[i + pf_dist], 0, 0);
+        }
+        /* No gather on NEON: load document lengths lane by lane */
+        for (int j = 0; j < 4; j++) {
+            dl_lanes[j] = doc_len[col_idx[i + j]];
+        }
+        float32x4_t dl = vld1q_f32(dl_lanes);
+        float32x4_t tf_vec = vld1q_f32(tf + i);
+        float32x4_t norm = vfmaq_f32(one_minus_b_vec, b_vec, dl);
+        float32x4_t denom = vfmaq_f32(tf_vec, k1_vec, norm);
+        float32x4_t num = vmulq_f32(tf_vec, idf_k1p1_vec);
+        vst1q_f32(out, vdivq_f32(num, denom));
+        for (int j = 0; j < 4; j++) {
+            scores_out[col_idx[i + j]] += out[j];
+        }
+    }
+#endif
+
+    for (; i < n; i++) {
+        if (i < n_pf) {
+            __builtin_prefetch(&scores_out[col_idx[i + pf_dist]], 1, 0);
+            __builtin_prefetch(&doc_len[col_idx[i + pf_dist]], 0, 0);
+            __builtin_prefetch(&tf[i + pf_dist], 0, 0);
+        }
+        int32_t d = col_idx[i];
+        float denom = tf[i] + k1 * (one_minus_b + b * doc_len[d] * inv_avgdl);
+        scores_out[d] += idf_k1p1 * tf[i] / denom;
+    }
+}
@@ -1,4 +1,5 @@
 """Base classes for vector stores."""
+import asyncio
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
@@ -6,8 +7,13 @@ class VectorStore(ABC):
     """Abstract base class for vector stores."""
     
     @abstractmethod
-    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
-        """Add texts to the vector store."""
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        batch_size: int = 64
+    ) -> List[str]:
+        """Add texts to the vector store, embedding them batch_size at a time."""
         pass
     
     @abstractmethod
@@ -15,7 +21,15 @@ class VectorStore(ABC):
         """Search for similar texts."""
         pass
     
+    async def asimilarity_search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        """Search for similar texts without blocking the event loop."""
+        return await asyncio.to_thread(self.similarity_search, query, k)
+    
     @abstractmethod
     def delete(self, ids: List[str]) -> None:
         """Delete texts by their IDs."""
         pass
+    
+    def warmup(self) -> None:
+        """Prepare the store for its first query; a no-op unless a store has lazy state."""
+        pass
@@ -0,0 +1,406 @@
+"""Okapi BM25 index over contiguous NumPy arrays."""
+import bisect
+import ctypes
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Callable, Tuple
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+def _load_kernel() -> Optional[Callable]:
+    """Load the compiled SIMD posting-list kernel, if it has been built."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_bm25_kernel.so")
+    if not os.path.exists(path):
+        return None
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError as e:
+        print(f"Could not load BM25 kernel {path}, using NumPy: {e}")
+        return None
+    
+    kernel = lib.bm25_score_term
+    kernel.restype = None
+    kernel.argtypes = [
+        ctypes.c_void_p,  # scores_out (float32[N])
+        ctypes.c_void_p,  # col_idx (int32[n])
+        ctypes.c_void_p,  # tf (float32[n])
+        ctypes.c_void_p,  # doc_len (float32[N])
+        ctypes.c_float,   # idf_t
+        ctypes.c_float,   # k1
+        ctypes.c_float,   # b
+        ctypes.c_float,   # avgdl
+        ctypes.c_int64,   # n
+        ctypes.c_int64    # pf_dist
+    ]
+    return kernel
+
+# None when _bm25_kernel.c hasn't been compiled; scoring falls back to NumPy
+_score_term = _load_kernel()
+
+# How many postings ahead the kernel prefetches scores/doc_len/tf (0 disables)
+_PREFETCH_DIST = int(os.environ.get("RAG_SQLITE_PREFETCH", "32"))
+
+# The threaded kernel only pays off when a query's postings cover the corpus
+# several times over; lighter queries stay on serial MaxScore + the C kernel
+_PARALLEL_MIN_POSTINGS = 100_000
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _score_terms_parallel(term_indptr, docs, tf, weights, doc_len, k1, b, avgdl, n_docs):
+        """
+        Score several terms' postings at once, one term per thread. Each term
+        writes its own row of partial scores (doc ids within a term are unique),
+        and rows are then summed per document in term order, also in parallel.
+        """
+        n_terms = len(weights)
+        partial = np.zeros((n_terms, n_docs), dtype=np.float32)
+        for ti in numba.prange(n_terms):
+            w = weights[ti]
+            for j in range(term_indptr[ti], term_indptr[ti + 1]):
+                d = docs[j]
+                partial[ti, d] = w * (tf[j] * (k1 + 1)) / (tf[j] + k1 * (1 - b + b * doc_len[d] / avgdl))
+        
+        scores = np.empty(n_docs, dtype=np.float32)
+        for d in numba.prange(n_docs):
+            total = np.float32(0)
+            for ti in range(n_terms):
+                total += partial[ti, d]
+            scores[d] = total
+        return scores
+else:
+    # Without numba, multi-term queries are scored term by term
+    _score_terms_parallel = None
+
+def _grow(arr: np.ndarray, size: int, fill) -> np.ndarray:
+    """Return arr with room for at least size entries, doubling capacity as needed."""
+    if size <= len(arr):
+        return arr
+    grown = np.full(max(size, 2 * len(arr)), fill, dtype=arr.dtype)
+    grown[:len(arr)] = arr
+    return grown
+
+class BM25Index:
+    """
+    BM25Okapi scoring (same formula and IDF flooring as rank_bm25) over a
+    structure-of-arrays index that is maintained incrementally.
+    
+    Terms are interned to dense int32 ids through the vocab mapping, which
+    callers may seed (and persist) to feed pre-encoded documents through
+    add_encoded(). Postings are stored term-major as per-term lists of
+    (doc_idx, tf) array chunks; each add() appends one chunk per term it touches, and chunks are
+    merged into one contiguous array the first time the term is queried.
+    Document frequencies and lengths are updated on add and remove, while
+    IDF and the average length are recomputed only when a query follows a
+    change. Removed documents are tombstoned and skipped at query time.
+    """
+    
+    def __init__(
+        self,
+        corpus: Optional[List[List[str]]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        vocab: Optional[Dict[str, int]] = None
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        # term -> id; ids must be 0..len(vocab)-1, in insertion order
+        self.vocab = dict(vocab) if vocab else {}
+        
+        # Document state, indexed by position (tombstoned positions are never reused)
+        self.n_docs = 0
+        self.n_live = 0
+        self.sum_doc_len = 0.0
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        
+        # Term state, indexed by term id; arrays may have spare capacity past len(vocab)
+        self.df = np.zeros(0, dtype=np.int64)
+        self.max_tf = np.zeros(0, dtype=np.float32)
+        self.min_dl = np.zeros(0, dtype=np.float32)
+        self._postings: List[List[Tuple[np.ndarray, np.ndarray]]] = []
+        self._stale = set()  # terms whose postings still include removed documents
+        
+        # Doc-major (first_doc, doc_indptr, term_ids) per add() batch, for removals
+        self._batches = []
+        self._batch_starts = []
+        
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.avgdl = 0.0
+        self._dirty = False
+        
+        if corpus:
+            self.add(corpus)
+    
+    def __len__(self) -> int:
+        return self.n_live
+    
+    @property
+    def n_removed(self) -> int:
+        """Number of tombstoned documents still occupying index positions."""
+        return self.n_docs - self.n_live
+    
+    def encode(self, tokens: List[str]) -> np.ndarray:
+        """Map tokens to int32 term ids, adding unseen terms to the vocab."""
+        vocab = self.vocab
+        return np.asarray([vocab.setdefault(term, len(vocab)) for term in tokens], dtype=np.int32)
+    
+    def add(self, corpus: List[List[str]]) -> None:
+        """Append tokenized documents; they take the next free positions."""
+        self.add_encoded([self.encode(tokens) for tokens in corpus])
+    
+    def add_encoded(self, docs: List[np.ndarray]) -> None:
+        """Append documents given as int32 term-id arrays from encode() or a matching vocab."""
+        if not docs:
+            return
+        first = self.n_docs
+        n_terms = len(self.vocab)
+        
+        # Collapse every document to (term, tf) pairs at once: one distinct
+        # doc * n_terms + term key per pair, sorted by document then term
+        lengths = np.asarray([len(doc) for doc in docs], dtype=np.int64)
+        flat = np.concatenate(docs).astype(np.int64)
+        keys, counts = np.unique(np.repeat(np.arange(len(docs)), lengths) * n_terms + flat, return_counts=True)
+        local_docs = keys // n_terms if n_terms else keys
+        term_ids = (keys - local_docs * n_terms).astype(np.int32)
+        tfs = counts.astype(np.float32)
+        doc_indptr = np.concatenate(([0], np.cumsum(np.bincount(local_docs, minlength=len(docs)))))
+        doc_ids = (local_docs + first).astype(np.int32)
+        lengths = lengths.astype(np.float32)
+        
+        # Document statistics
+        end = first + len(docs)
+        self.doc_len = _grow(self.doc_len, end, 0)
+        self.doc_len[first:end] = lengths
+        self.alive = _grow(self.alive, end, False)
+        self.alive[first:end] = True
+        self.n_docs = end
+        self.n_live += len(docs)
+        self.sum_doc_len += float(lengths.sum())
+        
+        # Term statistics; max tf and min length bound each term's best score
+        n_terms = len(self.vocab)
+        self.df = _grow(self.df, n_terms, 0)
+        self.max_tf = _grow(self.max_tf, n_terms, 0)
+        self.min_dl = _grow(self.min_dl, n_terms, np.inf)
+        self.df[:n_terms] += np.bincount(term_ids, minlength=n_terms)
+        np.maximum.at(self.max_tf, term_ids, tfs)
+        np.minimum.at(self.min_dl, term_ids, lengths[doc_ids - first])
+        
+        # Append one posting chunk per term (stable sort keeps doc ids ascending)
+        self._postings.extend([] for _ in range(n_terms - len(self._postings)))
+        order = np.argsort(term_ids, kind="stable")
+        sorted_terms = term_ids[order]
+        sorted_docs = doc_ids[order]
+        sorted_tfs = tfs[order]
+        bounds = np.flatnonzero(np.diff(sorted_terms)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(order)]))
+        if len(order):
+            for start, stop in zip(starts, ends):
+                self._postings[sorted_terms[start]].append((sorted_docs[start:stop], sorted_tfs[start:stop]))
+        
+        self._batches.append((first, doc_indptr, term_ids))
+        self._batch_starts.append(first)
+        self._dirty = True
+    
+    def remove(self, positions: List[int]) -> None:
+        """Tombstone documents by position and drop them from the statistics."""
+        for pos in positions:
+            if pos >= self.n_docs or not self.alive[pos]:
+                continue
+            first, doc_indptr, term_ids = self._batches[bisect.bisect_right(self._batch_starts, pos) - 1]
+            terms = term_ids[doc_indptr[pos - first]:doc_indptr[pos - first + 1]]
+            self.df[terms] -= 1
+            self._stale.update(terms.tolist())
+            self.alive[pos] = False
+            self.n_live -= 1
+            self.sum_doc_len -= float(self.doc_len[pos])
+        self._dirty = True
+    
+    def _refresh(self) -> None:
+        """Recompute IDF and average length if documents changed since the last query."""
+        if not self._dirty:
+            return
+        df = self.df[:len(self.vocab)]
+        idf = np.log(self.n_live - df + 0.5) - np.log(df + 0.5)
+        # Negative IDFs are floored to epsilon * average IDF over terms still present
+        present = df > 0
+        if present.any():
+            idf[(idf < 0) & present] = self.epsilon * idf[present].mean()
+        self.idf = idf.astype(np.float32)
+        self.avgdl = self.sum_doc_len / self.n_live if self.n_live else 0.0
+        self._dirty = False
+    
+    def _get_postings(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Live (doc_idx, tf) postings of a term as contiguous arrays."""
+        chunks = self._postings[t]
+        if len(chunks) == 1 and t not in self._stale:
+            return chunks[0]
+        
+        docs = np.concatenate([c[0] for c in chunks])
+        tf = np.concatenate([c[1] for c in chunks])
+        if t in self._stale:
+            keep = self.alive[docs]
+            docs = docs[keep]
+            tf = tf[keep]
+            self._stale.discard(t)
+        self._postings[t] = [(docs, tf)]
+        return docs, tf
+    
+    def _max_score(self, t: int) -> float:
+        """Upper bound of term t's contribution to any document."""
+        max_tf = self.max_tf[t]
+        return float(self.idf[t] * max_tf * (self.k1 + 1)
+                     / (max_tf + self.k1 * (1 - self.b + self.b * self.min_dl[t] / self.avgdl)))
+    
+    def _query_terms(self, query_tokens: List[str]) -> List[Tuple[int, int]]:
+        """Map query tokens to (term_id, count), dropping terms no live document contains."""
+        # Repeated query tokens count once per occurrence, as in rank_bm25
+        terms = []
+        for term, count in Counter(query_tokens).items():
+            t = self.vocab.get(term)
+            # A seeded vocab can hold terms whose documents are all gone
+            if t is not None and t < len(self._postings) and self.df[t] > 0:
+                terms.append((t, count))
+        return terms
+    
+    def _score_postings(self, scores: np.ndarray, docs: np.ndarray, tf: np.ndarray, weight: float) -> None:
+        """Add weight * BM25 term saturation for the given postings into scores."""
+        if _score_term is not None:
+            _score_term(
+                scores.ctypes.data, docs.ctypes.data, tf.ctypes.data, self.doc_len.ctypes.data,
+                weight, self.k1, self.b, self.avgdl, len(docs), _PREFETCH_DIST
+            )
+        else:
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += weight * (tf * (self.k1 + 1)) / (tf + norm)
+    
+    def _use_parallel(self, terms: List[Tuple[int, int]]) -> bool:
+        """Whether a query is heavy enough for the threaded numba kernel to beat serial scoring."""
+        if _score_terms_parallel is None or len(terms) < 2 or numba.get_num_threads() < 2:
+            return False
+        n_postings = int(self.df[[t for t, _ in terms]].sum())
+        return n_postings >= max(_PARALLEL_MIN_POSTINGS, self.n_docs)
+    
+    def _score_parallel(self, terms: List[Tuple[int, int]]) -> np.ndarray:
+        """Score all query terms exhaustively with the numba kernel, one term per thread."""
+        postings = [self._get_postings(t) for t, _ in terms]
+        term_indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(docs) for docs, _ in postings], out=term_indptr[1:])
+        return _score_terms_parallel(
+            term_indptr,
+            np.concatenate([docs for docs, _ in postings]),
+            np.concatenate([tf for _, tf in postings]),
+            np.array([count * self.idf[t] for t, count in terms], dtype=np.float32),
+            self.doc_len, self.k1, self.b, self.avgdl, self.n_docs
+        )
+    
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """Score every document position against the query tokens (0 for removed ones)."""
+        self._refresh()
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if not self.avgdl:
+            return scores
+        
+        terms = self._query_terms(query_tokens)
+        if self._use_parallel(terms):
+            return self._score_parallel(terms)
+        
+        for t, count in terms:
+            docs, tf = self._get_postings(t)
+            self._score_postings(scores, docs, tf, count * self.idf[t])
+        
+        return scores
+    
+    def search(self, query_tokens: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (doc_positions, scores) of the top k live documents, best first.
+        
+        Terms are scored serially with MaxScore pruning. Multi-term queries
+        whose postings outnumber the documents are instead scored exhaustively
+        across threads when numba is installed and more than one thread is
+        available, as pruning saves little there.
+        """
+        self._refresh()
+        n_docs = self.n_docs
+        k = min(k, self.n_live)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        terms = self._query_terms(query_tokens) if self.avgdl else []
+        if self._use_parallel(terms):
+            scores = self._score_parallel(terms)
+        else:
+            scores = self._score_maxscore(terms, k)
+        
+        if self.n_live < n_docs:
+            scores[~self.alive[:n_docs]] = -np.inf
+        # O(N) selection of the top k, then an O(k log k) sort of just those
+        if k < n_docs:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+        else:
+            top = np.argsort(-scores, kind="stable")
+        return top, scores[top]
+    
+    def _score_maxscore(self, terms: List[Tuple[int, int]], k: int) -> np.ndarray:
+        """
+        Score terms with MaxScore pruning: terms are scored in decreasing order
+        of their maximum possible contribution, and once the remaining terms can
+        no longer lift a document past the current k-th best score, only the
+        surviving candidates are scored for the rest of the query. Scores of
+        pruned documents are left incomplete.
+        """
+        n_docs = self.n_docs
+        scores = np.zeros(n_docs, dtype=np.float32)
+        weights = [count * self.idf[t] for t, count in terms]
+        upper = [count * self._max_score(t) for t, count in terms]
+        order = sorted(range(len(terms)), key=lambda i: upper[i], reverse=True)
+        
+        # Bounds only hold if no term can lower a score
+        prune = all(w >= 0 for w in weights)
+        remaining = float(sum(upper))
+        touched = []      # postings scored before pruning starts
+        candidates = None  # doc positions still able to reach the top k
+        is_candidate = None
+        
+        for step, i in enumerate(order):
+            remaining -= upper[i]
+            docs, tf = self._get_postings(terms[i][0])
+            if is_candidate is not None:
+                keep = is_candidate[docs]
+                docs = docs[keep]
+                tf = tf[keep]
+            self._score_postings(scores, docs, tf, weights[i])
+            
+            if not prune or step == len(order) - 1:
+                continue
+            
+            if candidates is None:
+                touched.append(docs)
+                scored = np.unique(np.concatenate(touched))
+            else:
+                scored = candidates
+            if len(scored) < k:
+                continue
+            threshold = np.partition(scores[scored], len(scored) - k)[len(scored) - k]
+            
+            # Unscored documents sit at 0 and could still catch up
+            if candidates is None and remaining >= threshold:
+                continue
+            
+            survivors = scored[scores[scored] + remaining >= threshold]
+            if is_candidate is None:
+                is_candidate = np.zeros(n_docs, dtype=bool)
+            else:
+                is_candidate[scored] = False
+            is_candidate[survivors] = True
+            candidates = survivors
+        
+        return scores
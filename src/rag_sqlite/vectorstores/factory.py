@@ -1,8 +1,6 @@
 """Factory for creating vector stores."""
 from typing import Optional, Dict, Any
 from .base import VectorStore
-from .sqlite import SQLiteVectorStore
-from .milvus import MilvusVectorStore
 
 class VectorStoreFactory:
     """Factory for creating vector stores."""
@@ -18,15 +16,18 @@ class VectorStoreFactory:
         Returns:
             VectorStore: An instance of the requested vector store
         """
-        stores = {
-            'sqlite': SQLiteVectorStore,
-            'milvus': MilvusVectorStore
-        }
-        
-        if store_type not in stores:
-            raise ValueError(f"Unknown store type: {store_type}. Available types: {list(stores.keys())}")
+        # Import backends on demand so SQLite users never load pymilvus/torch
+        if store_type == 'sqlite':
+            from .sqlite import SQLiteVectorStore as store_class
+        elif store_type == 'milvus':
+            from .milvus import MilvusVectorStore as store_class
+        else:
+            raise ValueError(f"Unknown store type: {store_type}. Available types: ['sqlite', 'milvus']")
             
-        return stores[store_type](**kwargs)
+        store = store_class(**kwargs)
+        # Pay one-time initialization cost here rather than on the first search
+        store.warmup()
+        return store
 
 def create_vector_store(
     store_type: str,
@@ -1,5 +1,12 @@
 """Milvus-based vector store implementation."""
-from typing import List, Dict, Any, Optional
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Literal, Union
 import numpy as np
 from pymilvus import (
     connections,
@@ -13,49 +20,146 @@ from sentence_transformers import SentenceTransformer
 
 from .base import VectorStore
 
+# Embedding cache lives in cache/ at the repository root, alongside logs/
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'cache', 'embedding_cache.db'
+))
+
+def _default_device() -> str:
+    """Pick the fastest available torch device for the encoder."""
+    import torch
+    
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+@functools.lru_cache(maxsize=4)
+def _load_model(model_name: str, device: str) -> SentenceTransformer:
+    """Load an encoder once per process and share it across stores; half precision on CUDA."""
+    model = SentenceTransformer(model_name, device=device)
+    return model.half() if device == "cuda" else model
+
 class MilvusVectorStore(VectorStore):
     """Milvus implementation using sentence transformers for embeddings."""
     
+    INDEX_TYPES = {
+        "fp32": "HNSW",
+        "int8": "HNSW_SQ"
+    }
+    
+    # Query embeddings remembered per store, keyed by a hash of the query text
+    QUERY_CACHE_SIZE = 4096
+    
     def __init__(
         self,
         collection_name: str = "documents",
         host: str = "localhost",
         port: int = 19530,
-        model_name: str = "all-MiniLM-L6-v2"
+        model_name: str = "all-MiniLM-L6-v2",
+        dtype: Literal["fp32", "int8"] = "int8",
+        embedding_cache_path: Optional[str] = DEFAULT_EMBEDDING_CACHE_PATH,
+        ef: int = 64
     ):
+        """
+        dtype selects how Milvus stores vectors in the HNSW index: "int8" uses
+        scalar quantization (HNSW_SQ with SQ8, ~4x less memory), "fp32" keeps
+        full precision (HNSW). Only applies when the collection is created.
+        
+        ef is the HNSW search breadth; higher trades latency for recall. It is
+        raised to k for searches asking for more than ef results.
+        
+        embedding_cache_path is a SQLite file that remembers chunk embeddings
+        by content hash, so re-indexing unchanged text skips the encoder.
+        Pass None to disable the cache.
+        """
+        if dtype not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown dtype: {dtype}. Available types: {list(self.INDEX_TYPES.keys())}")
+        
         self.collection_name = collection_name
-        self.model = SentenceTransformer(model_name)
+        self.dtype = dtype
+        self.ef = ef
+        self.model_name = model_name
+        self.embedding_cache_path = embedding_cache_path
+        self.model = _load_model(model_name, _default_device())
         self.dim = self.model.get_sentence_embedding_dimension()
         
+        # Cache query embeddings so repeated questions skip the encoder
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        
         # Connect to Milvus
         connections.connect(host=host, port=port)
         self._ensure_collection()
     
     def _ensure_collection(self):
-        """Create collection if it doesn't exist."""
+        """Create collection if it doesn't exist, and load it for searching."""
         if utility.has_collection(self.collection_name):
             self.collection = Collection(self.collection_name)
-            return
+            # Keep searching existing collections with the metric and index they were built with
+            indexes = self.collection.indexes
+            index_params = indexes[0].params if indexes else {}
+            self.metric_type = index_params.get("metric_type", "L2" if indexes else "IP")
+            self.index_type = index_params.get("index_type", self.INDEX_TYPES[self.dtype])
+            # Collections created before fp16 transport store FLOAT_VECTOR
+            self.vector_type = next(
+                field.dtype for field in self.collection.schema.fields if field.name == "embedding"
+            )
+        else:
+            self._create_collection()
         
+        if self.index_type.startswith("IVF"):
+            self._search_params = {"metric_type": self.metric_type, "params": {"nprobe": 10}}
+        else:
+            self._search_params = {"metric_type": self.metric_type, "params": {"ef": self.ef}}
+        
+        # Load segments into the query nodes once rather than on every search
+        self._loaded = False
+        self.refresh()
+    
+    def _create_collection(self):
+        """Create the collection and its vector index."""
         fields = [
             FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
             FieldSchema(name="metadata", dtype=DataType.JSON),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim)
+            # Half precision halves insert payloads and segment size; embeddings
+            # are normalized, so fp16 loses nothing that matters for ranking
+            FieldSchema(name="embedding", dtype=DataType.FLOAT16_VECTOR, dim=self.dim)
         ]
+        self.vector_type = DataType.FLOAT16_VECTOR
         
         schema = CollectionSchema(fields=fields, description="Document store")
         self.collection = Collection(self.collection_name, schema)
         
-        # Create index
+        # Create index. Embeddings are L2-normalized, so inner product is
+        # cosine similarity without per-vector norms at query time
+        self.metric_type = "IP"
+        self.index_type = self.INDEX_TYPES[self.dtype]
+        params = {"M": 16, "efConstruction": 200}
+        if self.dtype == "int8":
+            params["sq_type"] = "SQ8"
         index_params = {
-            "metric_type": "L2",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 1024}
+            "metric_type": self.metric_type,
+            "index_type": self.index_type,
+            "params": params
         }
         self.collection.create_index("embedding", index_params)
     
-    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    def refresh(self) -> None:
+        """(Re)load the collection into memory, e.g. after its schema or index changed."""
+        if self._loaded:
+            self.collection.release()
+        self.collection.load()
+        self._loaded = True
+    
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        batch_size: int = 128
+    ) -> List[str]:
         """Add texts to Milvus."""
         if metadatas is None:
             metadatas = [{} for _ in texts]
@@ -69,44 +173,170 @@ class MilvusVectorStore(VectorStore):
             if len(text) > MAX_TEXT_LENGTH:
                 # Split the text into chunks
                 chunks = [text[i:i + MAX_TEXT_LENGTH] for i in range(0, len(text), MAX_TEXT_LENGTH)]
-                for i, chunk in enumerate(chunks):
-                    processed_texts.append(chunk)
-                    chunk_metadata = metadata.copy()
-                    chunk_metadata['chunk_index'] = i
-                    chunk_metadata['total_chunks'] = len(chunks)
-                    processed_metadatas.append(chunk_metadata)
+                n_chunks = len(chunks)
+                processed_texts.extend(chunks)
+                processed_metadatas.extend(
+                    {**metadata, 'chunk_index': i, 'total_chunks': n_chunks} for i in range(n_chunks)
+                )
             else:
                 processed_texts.append(text)
                 processed_metadatas.append(metadata)
         
-        # Generate embeddings
-        embeddings = self.model.encode(processed_texts)
+        # Generate embeddings in batches
+        embeddings = self._embed_texts(processed_texts, batch_size)
         
         # Generate IDs
-        ids = [str(i) for i in range(len(processed_texts))]
+        ids = [uuid.uuid4().hex for _ in processed_texts]
         
         # Insert into Milvus
         entities = [
             ids,
             processed_texts,
             processed_metadatas,
-            embeddings.tolist()
+            self._to_milvus(embeddings)
         ]
         
         self.collection.insert(entities)
         self.collection.flush()
         return ids
     
+    def _chunk_key(self, text: str) -> bytes:
+        """Embedding cache key for a chunk: hash of the model name and chunk text."""
+        return hashlib.blake2b(self.model_name.encode() + text.encode(), digest_size=16).digest()
+    
+    def _load_cached_embeddings(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Fetch cached embeddings for the given chunk keys."""
+        cached = {}
+        os.makedirs(os.path.dirname(os.path.abspath(self.embedding_cache_path)), exist_ok=True)
+        with sqlite3.connect(self.embedding_cache_path) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS emb_cache (h BLOB PRIMARY KEY, v BLOB)')
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ','.join('?' for _ in batch)
+                rows = conn.execute(f'SELECT h, v FROM emb_cache WHERE h IN ({placeholders})', batch)
+                for h, v in rows:
+                    cached[h] = np.frombuffer(v, dtype=np.float16)
+        return cached
+    
+    def _store_cached_embeddings(self, keys: List[bytes], embeddings: np.ndarray) -> None:
+        """Persist embeddings as float16 bytes keyed by chunk key."""
+        with sqlite3.connect(self.embedding_cache_path) as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO emb_cache (h, v) VALUES (?, ?)',
+                [(key, row.astype(np.float16).tobytes()) for key, row in zip(keys, embeddings)]
+            )
+    
+    def _encode_by_length(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        Encode texts in batches of similar token length, returned in input order.
+        Each batch is padded only to its own longest member, so short chunks
+        don't pay for the long ones they would otherwise share a batch with.
+        """
+        # encode() truncates to max_seq_length, so anything longer pads the same.
+        # Fast tokenizers encode the full input before truncating, so measure
+        # on a prefix. WordPiece averages ~4 characters per token on English
+        # text, so 8 per token still reaches max_seq_length for long chunks
+        max_len = self.model.max_seq_length
+        lengths = self.model.tokenizer(
+            [text[:max_len * 8] for text in texts],
+            add_special_tokens=False,
+            truncation=True,
+            max_length=max_len,
+            return_length=True
+        )["length"]
+        order = np.argsort(lengths, kind="stable")
+        
+        # Collected as float32 whatever precision the model runs in
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i in range(0, len(texts), batch_size):
+            batch = order[i:i + batch_size]
+            out[batch] = self.model.encode(
+                [texts[j] for j in batch],
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        return out
+    
+    def _embed_texts(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        Embed chunks as a float32 (len(texts), dim) array. Chunks seen before
+        with the same model come from the embedding cache; only the rest are
+        encoded.
+        """
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        if self.embedding_cache_path:
+            keys = [self._chunk_key(text) for text in texts]
+            cached = self._load_cached_embeddings(keys)
+        else:
+            keys = [None] * len(texts)
+            cached = {}
+        
+        misses = []
+        for i, key in enumerate(keys):
+            if key in cached:
+                embeddings[i] = cached[key]
+            else:
+                misses.append(i)
+        
+        if misses:
+            encoded = self._encode_by_length([texts[i] for i in misses], batch_size)
+            embeddings[misses] = encoded
+            if self.embedding_cache_path:
+                self._store_cached_embeddings([keys[i] for i in misses], encoded)
+        
+        return embeddings
+    
+    def _to_milvus(self, embeddings: np.ndarray) -> List[Union[bytes, List[float]]]:
+        """Convert embedding rows for insert: fp16 bytes or float lists, per the collection's vector type."""
+        if self.vector_type == DataType.FLOAT16_VECTOR:
+            return [row.tobytes() for row in embeddings.astype(np.float16)]
+        return embeddings.astype(np.float32, copy=False).tolist()
+    
+    def warmup(self) -> None:
+        """Run one throwaway encode so the first real query doesn't pay for lazy initialization."""
+        self.model.encode(["warmup"], normalize_embeddings=True, show_progress_bar=False)
+    
+    def _to_milvus_query(self, embedding: np.ndarray) -> Union[np.ndarray, List[float]]:
+        """
+        Convert a query embedding for search. fp16 queries must be float16
+        ndarrays: pymilvus sends raw bytes as a binary-vector placeholder.
+        """
+        if self.vector_type == DataType.FLOAT16_VECTOR:
+            return embedding.astype(np.float16)
+        return embedding.astype(np.float32, copy=False).tolist()
+    
+    def _embed_query(self, query: str) -> Union[np.ndarray, List[float]]:
+        """Embed a single query string, serving repeats from the LRU cache."""
+        key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(key)
+            if embedding is not None:
+                self._query_cache.move_to_end(key)
+                return embedding
+        
+        embedding = self._to_milvus_query(self.model.encode([query], normalize_embeddings=True)[0])
+        with self._query_cache_lock:
+            self._query_cache[key] = embedding
+            if len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return embedding
+    
     def similarity_search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
         """Search for similar texts in Milvus."""
         # Generate query embedding
-        query_embedding = self.model.encode([query])[0]
+        query_embedding = self._embed_query(query)
+        
+        # HNSW needs ef >= k
+        search_params = self._search_params
+        if "ef" in search_params["params"] and k > search_params["params"]["ef"]:
+            search_params = {"metric_type": self.metric_type, "params": {"ef": k}}
         
         # Search in Milvus
-        self.collection.load()
-        search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
         results = self.collection.search(
-            data=[query_embedding.tolist()],
+            data=[query_embedding],
             anns_field="embedding",
             param=search_params,
             limit=k,
@@ -127,6 +357,10 @@ class MilvusVectorStore(VectorStore):
     
     def delete(self, ids: List[str]) -> None:
         """Delete texts by their IDs."""
-        expr = f'id in {ids}'
-        self.collection.delete(expr)
+        # Keep each boolean expression short enough to parse cheaply server-side
+        DELETE_BATCH_SIZE = 1000
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[i:i + DELETE_BATCH_SIZE]
+            expr = 'id in [' + ','.join(f'"{doc_id}"' for doc_id in batch) + ']'
+            self.collection.delete(expr)
         self.collection.flush()
@@ -1,77 +1,167 @@
 """SQLite-based vector store implementation."""
+import contextlib
+import itertools
 import json
+import re
 import sqlite3
+import threading
 import uuid
 from typing import List, Dict, Any, Optional
-from rank_bm25 import BM25Okapi
-from nltk.tokenize import word_tokenize
-import nltk
+import numpy as np
 
 from .base import VectorStore
+from .bm25 import BM25Index
 
-nltk.download('punkt', quiet=True)
+# Lowercase Unicode word runs (accented letters, Greek symbols); BM25 only needs
+# word tokens, not a full NLTK pipeline
+_TOKEN_RE = re.compile(r"\w+")
+
+def _tokenize(s: str) -> List[str]:
+    return _TOKEN_RE.findall(s.lower())
 
 class SQLiteVectorStore(VectorStore):
     """SQLite implementation using BM25 for similarity search."""
     
     def __init__(self, db_path: str = "vectors.db"):
         self.db_path = db_path
+        
+        # One long-lived connection keeps SQLite's page cache and parsed schema
+        # warm across calls; the lock serializes access from worker threads
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        self._conn.execute('PRAGMA cache_size=-64000')  # 64 MB page cache
+        
         self.setup_db()
-        self.bm25_index = None
-        self.documents = []
+        self.bm25_index = BM25Index()
+        self.documents = []   # by index position; None once deleted
+        self._positions = {}  # document id -> index position
+        self._n_saved_terms = 0  # leading vocab entries already in the vocab table
         self.load_documents()
     
     def setup_db(self):
         """Initialize the SQLite database."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             conn.execute('''
             CREATE TABLE IF NOT EXISTS documents (
                 id TEXT PRIMARY KEY,
                 text TEXT,
                 metadata TEXT,
-                tokens TEXT
+                tokens BLOB
             )
             ''')
+            # Tokens are stored as packed int32 term ids into this table. The
+            # unique index also covers vocab tables created without it, and
+            # refuses to build over ids that were already assigned twice
+            conn.execute('CREATE TABLE IF NOT EXISTS vocab (term TEXT PRIMARY KEY, id INTEGER NOT NULL)')
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS vocab_id ON vocab (id)')
     
     def load_documents(self):
         """Load documents from SQLite and rebuild BM25 index."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute('SELECT * FROM documents').fetchall()
+        with self._lock:
+            vocab = dict(self._conn.execute('SELECT term, id FROM vocab ORDER BY id'))
+            if list(vocab.values()) != list(range(len(vocab))):
+                raise sqlite3.IntegrityError("vocab table ids are not dense 0..n-1; the token index is corrupt")
+            index = BM25Index(vocab=vocab)
+            self._n_saved_terms = len(vocab)
+            
+            cursor = self._conn.execute('SELECT id, text, metadata, tokens FROM documents')
+            cursor.row_factory = sqlite3.Row
+            rows = cursor.fetchall()
             
             self.documents = []
-            tokenized_docs = []
+            encoded_docs = []
+            legacy = []  # positions of rows still holding JSON token lists
             
             for row in rows:
                 self.documents.append({
                     'id': row['id'],
                     'text': row['text'],
-                    'metadata': json.loads(row['metadata']),
-                    'tokens': json.loads(row['tokens'])
+                    'metadata': json.loads(row['metadata'])
                 })
-                tokenized_docs.append(json.loads(row['tokens']))
+                if isinstance(row['tokens'], bytes):
+                    encoded_docs.append(np.frombuffer(row['tokens'], dtype=np.int32))
+                else:
+                    encoded_docs.append(None)
+                    legacy.append(len(encoded_docs) - 1)
+            
+            if legacy:
+                # Rows from older versions hold a JSON token list; re-tokenize
+                # with the current tokenizer and rewrite them as term ids
+                with self._vocab_transaction(index) as conn:
+                    for i in legacy:
+                        encoded_docs[i] = index.encode(_tokenize(rows[i]['text']))
+                    conn.executemany(
+                        'UPDATE documents SET tokens = ? WHERE id = ?',
+                        [(encoded_docs[i].tobytes(), rows[i]['id']) for i in legacy]
+                    )
             
-            if tokenized_docs:
-                self.bm25_index = BM25Okapi(tokenized_docs)
+            index.add_encoded(encoded_docs)
+            self.bm25_index = index
+            self._positions = {doc['id']: i for i, doc in enumerate(self.documents)}
     
-    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
-        """Add texts to the vector store."""
+    def _sync_vocab(self, conn: sqlite3.Connection, index: BM25Index) -> None:
+        """Pull in vocab rows other connections committed since this store last read the table."""
+        rows = conn.execute('SELECT term, id FROM vocab WHERE id >= ? ORDER BY id', (self._n_saved_terms,))
+        for term, term_id in rows:
+            if term_id != len(index.vocab) or term in index.vocab:
+                raise sqlite3.IntegrityError(f"vocab table is inconsistent at term {term!r} (id {term_id})")
+            index.vocab[term] = term_id
+        self._n_saved_terms = len(index.vocab)
+    
+    @contextlib.contextmanager
+    def _vocab_transaction(self, index: BM25Index):
+        """
+        Write transaction for statements that may encode new terms. It takes
+        SQLite's write lock up front and syncs the vocab first, so stores
+        sharing a database never hand out the same term id. Terms encoded in
+        the block are saved on commit and dropped from the index on rollback.
+        """
+        try:
+            with self._conn as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._sync_vocab(conn, index)
+                yield conn
+                new_terms = itertools.islice(index.vocab.items(), self._n_saved_terms, None)
+                conn.executemany('INSERT INTO vocab (term, id) VALUES (?, ?)', new_terms)
+        except BaseException:
+            index.vocab = dict(itertools.islice(index.vocab.items(), self._n_saved_terms))
+            raise
+        self._n_saved_terms = len(index.vocab)
+    
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        batch_size: int = 64
+    ) -> List[str]:
+        """Add texts to the vector store. batch_size is unused as BM25 needs no embeddings."""
         if metadatas is None:
             metadatas = [{} for _ in texts]
         
-        ids = []
-        with sqlite3.connect(self.db_path) as conn:
-            for text, metadata in zip(texts, metadatas):
-                doc_id = str(uuid.uuid4())
-                tokens = word_tokenize(text.lower())
-                
-                conn.execute(
+        ids = [uuid.uuid4().hex for _ in texts]
+        
+        tokenized_docs = [_tokenize(text) for text in texts]
+        
+        with self._lock:
+            # One transaction for the whole batch, including any new vocab terms
+            with self._vocab_transaction(self.bm25_index) as conn:
+                encoded_docs = [self.bm25_index.encode(tokens) for tokens in tokenized_docs]
+                conn.executemany(
                     'INSERT INTO documents (id, text, metadata, tokens) VALUES (?, ?, ?, ?)',
-                    (doc_id, text, json.dumps(metadata), json.dumps(tokens))
+                    [
+                        (doc_id, text, json.dumps(metadata), term_ids.tobytes())
+                        for doc_id, text, metadata, term_ids in zip(ids, texts, metadatas, encoded_docs)
+                    ]
                 )
-                ids.append(doc_id)
-        
-        self.load_documents()  # Rebuild index
+            
+            # Extend the index with just the new documents
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._positions[doc_id] = len(self.documents)
+                self.documents.append({'id': doc_id, 'text': text, 'metadata': metadata})
+            self.bm25_index.add_encoded(encoded_docs)
         return ids
     
     def similarity_search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
@@ -79,29 +169,44 @@ class SQLiteVectorStore(VectorStore):
         if not self.bm25_index:
             return []
         
-        query_tokens = word_tokenize(query.lower())
-        scores = self.bm25_index.get_scores(query_tokens)
-        
-        # Get top k documents
-        top_k_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        results = []
+        query_tokens = _tokenize(query)
         
-        for idx in top_k_indices:
-            if idx < len(self.documents):
+        # Searches merge posting chunks in place, so they share the lock with writers
+        with self._lock:
+            # Get top k documents
+            top_k_indices, top_k_scores = self.bm25_index.search(query_tokens, k)
+            results = []
+            
+            for idx, score in zip(top_k_indices, top_k_scores):
                 doc = self.documents[idx]
-                results.append({
-                    'id': doc['id'],
-                    'text': doc['text'],
-                    'metadata': doc['metadata'],
-                    'score': scores[idx]
-                })
+                if doc is not None:
+                    results.append({
+                        'id': doc['id'],
+                        'text': doc['text'],
+                        'metadata': doc['metadata'],
+                        'score': float(score)
+                    })
         
         return results
     
     def delete(self, ids: List[str]) -> None:
         """Delete texts by their IDs."""
-        with sqlite3.connect(self.db_path) as conn:
-            placeholders = ','.join('?' for _ in ids)
-            conn.execute(f'DELETE FROM documents WHERE id IN ({placeholders})', ids)
-        
-        self.load_documents()  # Rebuild index
+        with self._lock:
+            with self._conn as conn:
+                placeholders = ','.join('?' for _ in ids)
+                conn.execute(f'DELETE FROM documents WHERE id IN ({placeholders})', ids)
+            
+            # Tombstone deleted documents in the index
+            positions = [self._positions.pop(doc_id) for doc_id in ids if doc_id in self._positions]
+            for pos in positions:
+                self.documents[pos] = None
+            self.bm25_index.remove(positions)
+            
+            # Compact once tombstones outnumber live documents
+            if self.bm25_index.n_removed > len(self.bm25_index):
+                self.load_documents()
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,5 @@
+"""Put src/rag_sqlite on the path, as the scripts there import its packages directly."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "rag_sqlite"))
@@ -0,0 +1,113 @@
+"""Randomized checks of BM25Index against rank_bm25's BM25Okapi."""
+import random
+
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+import vectorstores.bm25 as bm25
+from vectorstores.bm25 import BM25Index
+
+WORDS = [f"w{i}" for i in range(100)]
+
+def random_doc(rng: random.Random):
+    # Skewed vocabulary so some terms are common enough to get negative IDFs
+    return [rng.choice(WORDS[:rng.randint(5, 100)]) for _ in range(rng.randint(1, 40))]
+
+def random_query(rng: random.Random):
+    return [rng.choice(WORDS) for _ in range(rng.randint(1, 5))]
+
+def assert_matches(index: BM25Index, docs, rng: random.Random, n_queries: int = 10):
+    """Compare scores and top-k search of the live documents with a fresh BM25Okapi."""
+    live = [i for i, doc in enumerate(docs) if doc is not None]
+    ref = BM25Okapi([docs[i] for i in live])
+    for _ in range(n_queries):
+        query = random_query(rng)
+        k = rng.randint(1, 8)
+        expected = ref.get_scores(query)
+        np.testing.assert_allclose(index.get_scores(query)[live], expected, rtol=1e-4, atol=1e-4)
+        
+        positions, scores = index.search(query, k)
+        assert all(docs[p] is not None for p in positions)
+        np.testing.assert_allclose(scores, np.sort(expected)[::-1][:k], rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(scores, expected[[live.index(p) for p in positions]], rtol=1e-4, atol=1e-4)
+
+@pytest.fixture(params=["maxscore", "parallel"])
+def scoring_path(request, monkeypatch):
+    """Run each test on the serial MaxScore path and, when numba is installed, the threaded one."""
+    if request.param == "maxscore":
+        monkeypatch.setattr(bm25, "_score_terms_parallel", None)
+    else:
+        if bm25._score_terms_parallel is None:
+            pytest.skip("numba is not installed")
+        monkeypatch.setattr(BM25Index, "_use_parallel", lambda self, terms: len(terms) > 1)
+    return request.param
+
+def test_scores_match_rank_bm25(scoring_path):
+    rng = random.Random(0)
+    docs = [random_doc(rng) for _ in range(300)]
+    assert_matches(BM25Index(docs), docs, rng, n_queries=50)
+
+def test_incremental_add_and_remove(scoring_path):
+    rng = random.Random(3)
+    index = BM25Index()
+    docs = []  # by position; None once removed
+    for _ in range(30):
+        batch = [random_doc(rng) for _ in range(rng.randint(1, 20))]
+        index.add(batch)
+        docs.extend(batch)
+        
+        live = [i for i, doc in enumerate(docs) if doc is not None]
+        removed = rng.sample(live, min(len(live) // 5, 3))
+        for pos in removed:
+            docs[pos] = None
+        # Removing already-removed positions again must be a no-op
+        index.remove(removed + [i for i, doc in enumerate(docs) if doc is None][:2])
+        
+        assert len(index) == len(docs) - docs.count(None)
+        assert_matches(index, docs, rng)
+
+def test_encoded_documents_with_seeded_vocab():
+    rng = random.Random(5)
+    docs = [random_doc(rng) for _ in range(100)]
+    reference = BM25Index(docs)
+    
+    index = BM25Index(vocab=reference.vocab)
+    index.add_encoded([reference.encode(doc) for doc in docs])
+    for _ in range(20):
+        query = random_query(rng)
+        np.testing.assert_allclose(index.get_scores(query), reference.get_scores(query), rtol=1e-6)
+
+def test_search_edge_cases():
+    index = BM25Index()
+    positions, scores = index.search(["w1"], 3)
+    assert len(positions) == 0 and len(scores) == 0
+    
+    index.add([["w1", "w2"], ["w2"], ["w3"]])
+    index.remove([1])
+    positions, _ = index.search(["w2"], 10)
+    assert sorted(positions.tolist()) == [0, 2]
+    positions, _ = index.search(["unknown"], 2)
+    assert len(positions) == 2 and 1 not in positions.tolist()
+
+def test_maxscore_prunes_postings(monkeypatch):
+    monkeypatch.setattr(bm25, "_score_terms_parallel", None)
+    rng = random.Random(7)
+    docs = [random_doc(rng) for _ in range(2000)]
+    index = BM25Index(docs)
+    
+    scored = []
+    score_postings = BM25Index._score_postings
+    def counting_score_postings(self, scores, post_docs, tf, weight):
+        scored.append(len(post_docs))
+        score_postings(self, scores, post_docs, tf, weight)
+    monkeypatch.setattr(BM25Index, "_score_postings", counting_score_postings)
+    
+    total = 0
+    for _ in range(50):
+        query = random_query(rng)
+        index.search(query, 3)
+        total += sum(len(index._get_postings(t)[0]) for t, _ in index._query_terms(query))
+    assert sum(scored) < total
+    
+    assert_matches(index, docs, rng, n_queries=50)
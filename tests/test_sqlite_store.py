@@ -0,0 +1,67 @@
+"""SQLiteVectorStore persistence checks."""
+import json
+import sqlite3
+
+import pytest
+
+from vectorstores.sqlite import SQLiteVectorStore, _tokenize
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "vectors.db")
+
+def test_tokenizer_keeps_unicode_words():
+    assert _tokenize("naïve Q-learning with discount γ and Müller’s café") == [
+        "naïve", "q", "learning", "with", "discount", "γ", "and", "müller", "s", "café"
+    ]
+
+def test_stores_sharing_a_database_keep_term_ids_unique(db_path):
+    a = SQLiteVectorStore(db_path)
+    b = SQLiteVectorStore(db_path)
+    a.add_texts(["alpha document"])
+    b.add_texts(["beta report"])
+    a.add_texts(["gamma notes"])
+    a.close()
+    b.close()
+    
+    with sqlite3.connect(db_path) as conn:
+        ids = [term_id for _, term_id in conn.execute("SELECT term, id FROM vocab")]
+    assert sorted(ids) == list(range(6))
+    
+    # Three documents, so a term in one of them has a positive IDF
+    store = SQLiteVectorStore(db_path)
+    assert [r["text"] for r in store.similarity_search("beta", 1)] == ["beta report"]
+    store.close()
+
+def test_failed_insert_does_not_keep_new_terms(db_path):
+    store = SQLiteVectorStore(db_path)
+    with pytest.raises(TypeError):
+        store.add_texts(["zeta"], metadatas=[object()])
+    assert "zeta" not in store.bm25_index.vocab
+    
+    store.add_texts(["zeta eta"])
+    store.close()
+    with sqlite3.connect(db_path) as conn:
+        assert dict(conn.execute("SELECT term, id FROM vocab")) == {"zeta": 0, "eta": 1}
+
+def test_json_token_rows_are_migrated(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE documents (id TEXT PRIMARY KEY, text TEXT, metadata TEXT, tokens TEXT)")
+        conn.execute(
+            "INSERT INTO documents VALUES (?, ?, ?, ?)",
+            ("old", "Policy iteration, again.", "{}", json.dumps(["policy", "iteration", ",", "again", "."]))
+        )
+    
+    store = SQLiteVectorStore(db_path)
+    assert [r["id"] for r in store.similarity_search("iteration", 1)] == ["old"]
+    store.close()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT typeof(tokens) FROM documents").fetchone() == ("blob",)
+
+def test_corrupt_vocab_fails_loudly(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE vocab (term TEXT PRIMARY KEY, id INTEGER)")
+        conn.executemany("INSERT INTO vocab VALUES (?, ?)", [("alpha", 0), ("beta", 0)])
+    
+    with pytest.raises(sqlite3.IntegrityError):
+        SQLiteVectorStore(db_path)
@@ -0,0 +1,71 @@
+"""TextProcessor section splitting and header cache checks."""
+import pytest
+
+from processors import text_processor
+from processors.text_processor import TextProcessor, _DETECT_CHUNKSIZE
+
+PAGES = [
+    (0, "Preface text before any header.\nMore preface."),
+    (1, "Chapter 1: Basics\nIntro to the chapter.\n1.1 Agents\nAgents act."),
+    (2, "Agents continue acting on this page.\nStill section 1.1."),
+    (3, "1.2 Rewards\nRewards are scalar."),
+]
+
+@pytest.fixture
+def processor(tmp_path):
+    return TextProcessor(cache_path=str(tmp_path / "header_cache.db"))
+
+def test_text_before_first_header_is_introduction(processor):
+    sections = processor.split_by_sections(PAGES)
+    assert sections[0] == {
+        "header": "Introduction",
+        "content": "Preface text before any header.\nMore preface.",
+        "start_page": 0
+    }
+
+def test_header_at_page_start_opens_section_on_that_page(processor):
+    sections = processor.split_by_sections(PAGES)
+    assert [(s["header"], s["start_page"]) for s in sections] == [
+        ("Introduction", 0),
+        ("Chapter 1: Basics", 1),
+        ("1.1 Agents", 1),
+        ("1.2 Rewards", 3),
+    ]
+    assert sections[-1]["content"] == "\nRewards are scalar."
+
+def test_section_spans_pages_until_next_header(processor):
+    sections = processor.split_by_sections(PAGES)
+    agents = next(s for s in sections if s["header"] == "1.1 Agents")
+    assert agents["content"] == (
+        "\nAgents act.\n\nAgents continue acting on this page.\nStill section 1.1."
+    )
+
+def test_cache_hit_matches_cold_run(tmp_path):
+    cache_path = str(tmp_path / "header_cache.db")
+    cold = TextProcessor(cache_path=cache_path).split_by_sections(PAGES)
+    uncached = TextProcessor(cache_path=None).split_by_sections(PAGES)
+    
+    warm_processor = TextProcessor(cache_path=cache_path)
+    keys = [warm_processor._page_key(text) for _, text in PAGES]
+    assert len(warm_processor._load_cached_headers(keys)) == len(PAGES)
+    assert warm_processor.split_by_sections(PAGES) == cold == uncached
+
+def test_pool_path_matches_serial(processor, monkeypatch):
+    pages = [
+        (i, f"{i + 1}.1 Topic {i}\nBody of page {i}.\nSection {i}: Detail\nMore text.")
+        for i in range(3 * _DETECT_CHUNKSIZE + 1)
+    ]
+    serial = TextProcessor(cache_path=None).split_by_sections(pages)
+    
+    pools = []
+    class RecordingPool(text_processor.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs["max_workers"])
+            super().__init__(*args, **kwargs)
+    
+    monkeypatch.setattr(text_processor, "ProcessPoolExecutor", RecordingPool)
+    monkeypatch.setattr(text_processor, "_POOL_MIN_CHARS", 0)
+    monkeypatch.setattr(text_processor.os, "cpu_count", lambda: 2)
+    
+    assert processor.split_by_sections(pages) == serial
+    assert pools == [2]